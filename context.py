@@ -1,9 +1,52 @@
 
 from scikits.cuda import cublas as cubla
-import libcudnn
+import pycuda.driver as drv
+import pycuda.tools
+import libcudnn, libcublas, ctypes
+
+
+class ConvWorkspace:
+    """
+    One workspace buffer shared by all convolution layers. Layers run one at a
+    time, so a single buffer sized for the largest requirement is enough.
+    Layers request a size while configuring, the model allocates afterwards.
+    Algorithms needing more than limit bytes are not considered.
+    """
+    def __init__(self, limit):
+        self.limit = limit
+        self.ptr = 0
+        self.voidp = None
+        self.size = 0
+        self.max_seen = 0
+
+    def request(self, size):
+        self.max_seen = max(self.max_seen, size)
+
+    def ensure(self, size):
+        if size > self.size:
+            self.ptr = allocate(size)
+            self.voidp = ctypes.c_void_p(int(self.ptr))
+            self.size = size
+
+
+# caching allocator, freed blocks go back to the pool instead of cudaFree
+pool = pycuda.tools.DeviceMemoryPool()
+allocate = pool.allocate
 
 cublas = cubla.cublasCreate()
 cudnn = libcudnn.cudnnCreate()
+conv_ws = ConvWorkspace(256 * 1024 * 1024)
+
+# all cuDNN and cuBLAS work is queued on this compute stream, the driver
+# copies the next input batch on its own copy stream so the two overlap
+stream = drv.Stream()
+libcudnn.cudnnSetStream(cudnn, stream.handle)
+cubla.cublasSetStream(cublas, stream.handle)
+
+# allow tensor core kernels for the fp16 Linear layer GEMMs. Deprecated from
+# CUBLAS 11 on, where it would also let fp32 GEMMs use fp16 tensor cores.
+if 9000 <= libcublas._cublas_version < 11000:
+    libcublas.cublasSetMathMode(cublas, 'CUBLAS_TENSOR_OP_MATH')
 
 print("CUDNN Version: %d" % libcudnn.cudnnGetVersion())
 print("CUBLAS Version:", cubla.cublasGetVersion(cublas))
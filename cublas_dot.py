@@ -2,7 +2,17 @@ import numpy as np
 # from scikits.cuda import cublas
 import libcublas
 
-def cublas_gemm(cublas_handle, a, b, c=None):
+# CUBLAS 11 can run fp32 GEMMs on Ampere tensor cores with TF32 inputs, this
+# rounds the inputs to a 10 bit mantissa so it is only enabled on request
+# (--precision tf32)
+use_tf32 = False
+
+# GemmEx takes a cublasComputeType_t from CUBLAS 11 on, the cudaDataType
+# compatibility overload only exists in the C++ header
+compute_32f = 'CUBLAS_COMPUTE_32F' if libcublas._cublas_version >= 11000 else 'CUDA_R_32F'
+
+def cublas_gemm(cublas_handle, a, b, c=None, transb=False):
+    # row-major c = a . b, or a . b^T when transb is set
     assert(len(a.shape) == 2)
     assert(len(b.shape) == 2)
     assert(len(c.shape) == 2)
@@ -13,8 +23,9 @@ def cublas_gemm(cublas_handle, a, b, c=None):
     assert(a.dtype == b.dtype)
     assert(a.dtype == c.dtype)
     m = a.shape[0]
-    n = b.shape[1]
+    n = b.shape[0] if transb else b.shape[1]
     k = a.shape[1]
+    assert(b.shape[1 if transb else 0] == k)
 
     # print("m =", m)
     # print("n =", n)
@@ -32,17 +43,24 @@ def cublas_gemm(cublas_handle, a, b, c=None):
     # print("ldc =", ldc)
 
     opa = 'n'
-    opb = 'n'
+    opb = 't' if transb else 'n'
     # print("<T>gemm:", a.dtype)
     # print("DATA:", b.ptr, a.ptr, c.ptr)
     alpha = 1.0
     beta = 0.0
-    if a.dtype == np.float32:
+    if a.dtype == np.float32 and use_tf32 and libcublas._cublas_version >= 11000:
+        libcublas.cublasGemmEx(cublas_handle, opb, opa, n, m, k, alpha,
+                b.gpudata, 'CUDA_R_32F', ldb, a.gpudata, 'CUDA_R_32F', lda, beta,
+                c.gpudata, 'CUDA_R_32F', ldc, computeType='CUBLAS_COMPUTE_32F_FAST_TF32',
+                algo='CUBLAS_GEMM_DEFAULT_TENSOR_OP')
+    elif a.dtype == np.float32:
         libcublas.cublasSgemm(cublas_handle, opb, opa, n, m, k, 1.0, b.gpudata, ldb, a.gpudata, lda, 0.0, c.gpudata, ldc)
     else:
-        # assert(False)
-    
-        libcublas.cublasHgemm(cublas_handle, opb, opa, n, m, k, alpha, b.gpudata, ldb, a.gpudata, lda, beta, c.gpudata, ldc)
+        # fp16 storage but fp32 accumulation, Hgemm accumulates in fp16
+        libcublas.cublasGemmEx(cublas_handle, opb, opa, n, m, k, alpha,
+                b.gpudata, 'CUDA_R_16F', ldb, a.gpudata, 'CUDA_R_16F', lda, beta,
+                c.gpudata, 'CUDA_R_16F', ldc, computeType=compute_32f,
+                algo='CUBLAS_GEMM_DEFAULT_TENSOR_OP')
 
     # ch = c.get()
     # print(ch)
@@ -1,7 +1,9 @@
 import os.path
+import atexit
 import numpy as np
 from pycuda import gpuarray
 import libcudnn, ctypes
+import context
 
 np_2_cudnn_dtype = { 
     np.dtype(np.float16): libcudnn.cudnnDataType['CUDNN_DATA_HALF'],
@@ -41,9 +43,91 @@ class PoolingDesc:
     pass
 
 
+class DescriptorCache:
+    """
+    cuDNN descriptors keyed by their parameters, created on first use and
+    shared by every layer asking for the same configuration. Descriptors are
+    only destroyed at exit, so callers must never destroy what they get back.
+    """
+    def __init__(self):
+        self.tensors = {}
+        self.filters = {}
+        self.convs = {}
+        self.poolings = {}
+        self.activations = {}
+        atexit.register(self.destroy)
+
+    def get_tensor4d(self, n, c, h, w, dtype, fmt):
+        key = (n, c, h, w, dtype, fmt)
+        desc = self.tensors.get(key)
+        if desc is None:
+            desc = self.tensors[key] = TensorDesc((n, c, h, w), dtype, fmt)
+        return desc
+
+    def get_filter4d(self, k, c, r, s, dtype, fmt):
+        key = (k, c, r, s, dtype, fmt)
+        desc = self.filters.get(key)
+        if desc is None:
+            desc = libcudnn.cudnnCreateFilterDescriptor()
+            libcudnn.cudnnSetFilter4dDescriptor(desc, dtype, k, c, r, s, fmt)
+            self.filters[key] = desc
+        return desc
+
+    def get_conv(self, padH, padW, dH, dW, mode, compute_type, math_type):
+        key = (padH, padW, dH, dW, mode, compute_type, math_type)
+        desc = self.convs.get(key)
+        if desc is None:
+            desc = libcudnn.cudnnCreateConvolutionDescriptor()
+            libcudnn.cudnnSetConvolution2dDescriptor(desc, padH, padW, dH, dW, 1, 1, mode,
+                    compute_type)
+            libcudnn.cudnnSetConvolutionMathType(desc, math_type)
+            self.convs[key] = desc
+        return desc
+
+    def get_pooling(self, mode, kH, kW, padH, padW, dH, dW):
+        key = (mode, kH, kW, padH, padW, dH, dW)
+        desc = self.poolings.get(key)
+        if desc is None:
+            desc = libcudnn.cudnnCreatePoolingDescriptor()
+            libcudnn.cudnnSetPooling2dDescriptor(desc, mode, kH, kW, padH, padW, dH, dW)
+            self.poolings[key] = desc
+        return desc
+
+    def get_activation(self, mode, nan_opt, coef):
+        key = (mode, nan_opt, coef)
+        desc = self.activations.get(key)
+        if desc is None:
+            desc = libcudnn.cudnnCreateActivationDescriptor()
+            libcudnn.cudnnSetActivationDescriptor(desc, mode, nan_opt, coef)
+            self.activations[key] = desc
+        return desc
+
+    def destroy(self):
+        for desc in self.tensors.values():
+            libcudnn.cudnnDestroyTensorDescriptor(desc.ptr)
+        for desc in self.filters.values():
+            libcudnn.cudnnDestroyFilterDescriptor(desc)
+        for desc in self.convs.values():
+            libcudnn.cudnnDestroyConvolutionDescriptor(desc)
+        for desc in self.poolings.values():
+            libcudnn.cudnnDestroyPoolingDescriptor(desc)
+        for desc in self.activations.values():
+            libcudnn.cudnnDestroyActivationDescriptor(desc)
+        self.tensors.clear()
+        self.filters.clear()
+        self.convs.clear()
+        self.poolings.clear()
+        self.activations.clear()
+
+descriptors = DescriptorCache()
+
+
 class GPUTensor(gpuarray.GPUArray):
 
-    tensor_format = libcudnn.cudnnTensorFormat['CUDNN_TENSOR_NCHW']
+    # Tensors are stored channels-last (NHWC) so cuDNN can dispatch directly to
+    # its tensor core kernels. The numpy shape stays the logical (N,C,H,W) and
+    # only the memory layout differs; descriptors carry the format flag.
+    tensor_format = libcudnn.cudnnTensorFormat['CUDNN_TENSOR_NHWC']
 
     def __init__(self, initializer, dtype=None, shape=None):
 
@@ -61,11 +145,12 @@ class GPUTensor(gpuarray.GPUArray):
                 npdata = npdata.astype(dtype, copy=False)
             if shape != None:
                 npdata = npdata.reshape(shape)
-            super().__init__(npdata.shape, dtype=npdata.dtype)
-            self.set(npdata)
+            super().__init__(npdata.shape, dtype=npdata.dtype, allocator=context.allocate)
+            self.set_nchw(npdata)
         elif isinstance(initializer, tuple):
             # print("GPUTensor(shape=", initializer)
-            super().__init__(initializer, dtype=np.float32 if dtype is None else dtype)
+            super().__init__(initializer, dtype=np.float32 if dtype is None else dtype,
+                    allocator=context.allocate)
         elif isinstance(initializer, np.ndarray):
             # print("SHAPE:", initializer.shape)
             if dtype and dtype != initializer.dtype:
@@ -73,11 +158,14 @@ class GPUTensor(gpuarray.GPUArray):
 
             if shape is not None and shape != initializer.shape:
                 initializer = initializer.reshape(shape)
-            super().__init__(initializer.shape, dtype=initializer.dtype)
-            self.set(initializer)
+            super().__init__(initializer.shape, dtype=initializer.dtype, allocator=context.allocate)
+            self.set_nchw(initializer)
         else:
             raise NotImplementedError
 
+        # the device pointer never changes, wrap it for ctypes only once
+        self.voidp = ctypes.c_void_p(int(self.gpudata))
+
     def load_data(self, filename):
 
         ext = os.path.splitext(filename)[1]
@@ -93,11 +181,26 @@ class GPUTensor(gpuarray.GPUArray):
         # return libcudnn.cudnnDataType['CUDNN_DATA_FLOAT'] 
 
     def get_gpu_voidp(self):
-        return ctypes.c_void_p(int(self.gpudata))
+        return self.voidp
+
+    def set_nchw(self, data):
+        # upload host NCHW data into the channels-last memory layout
+        if self.ndim == 4 and self.tensor_format == libcudnn.cudnnTensorFormat['CUDNN_TENSOR_NHWC']:
+            data = np.ascontiguousarray(data.transpose(0, 2, 3, 1)).reshape(self.shape)
+        self.set(data)
+
+    def get_nchw(self):
+        # copy to host and undo the channels-last memory layout
+        data = self.get()
+        if self.ndim == 4 and self.tensor_format == libcudnn.cudnnTensorFormat['CUDNN_TENSOR_NHWC']:
+            n, c, h, w = self.shape
+            data = data.reshape((n, h, w, c)).transpose(0, 3, 1, 2)
+        return data
 
     def get_cudnn_tensor_desc(self):
         # desc = libcudnn.cudnnCreateTensorDescriptor()
         # libcudnn.cudnnSetTensor4dDescriptor(desc, self.tensor_format, self.get_cudnn_datatype(),
                 # self.shape[0], self.shape[1], self.shape[2], self.shape[3])
         # return desc
-        return TensorDesc(self.shape, self.get_cudnn_datatype())
+        n, c, h, w = self.shape
+        return descriptors.get_tensor4d(n, c, h, w, self.get_cudnn_datatype(), self.tensor_format)
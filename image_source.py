@@ -0,0 +1,25 @@
+import numpy as np
+
+class ImageSource:
+    """
+    Common part of the data sources. Subclasses implement read_image(),
+    returning the label and the center cropped PIL image of the next item.
+    """
+    crop_width = 224
+    crop_height = 224
+
+    def read_image(self):
+        raise NotImplementedError
+
+    def get_item_into(self, dst, average=0.0, std_dev=1.0):
+        """
+        Decode the next item directly into dst, a preallocated HWC view,
+        subtracting average while converting to its dtype, then scaling by
+        1/std_dev in place. Returns the label.
+        """
+        label, img = self.read_image()
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        np.subtract(np.asarray(img), average, out=dst, dtype=dst.dtype, casting='unsafe')
+        dst /= std_dev
+        return label
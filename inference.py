@@ -1,6 +1,5 @@
 
 import enum
-import math
 import os.path
 import numpy as np
 import argparse
@@ -15,6 +14,7 @@ import cublas_dot
 import libcudnn, ctypes
 
 from pycuda import gpuarray
+from pycuda.compiler import SourceModule
 from gputensor import GPUTensor
 import gputensor
 
@@ -24,15 +24,20 @@ parser.add_argument("--model", metavar="<filename>", required=True, type=str,
                     help="json model filename")
 parser.add_argument("--data", metavar="<path>", required=True, type=str,
                     help="path to lmdb dir or image directory")
-parser.add_argument("--precision", default="fp32", type=str, choices=["fp32","fp16"],
-                    help="floating point precision to use")
+parser.add_argument("--precision", default="fp32", type=str, choices=["fp32","fp16","tf32"],
+                    help="floating point precision to use, tf32 is fp32 with TF32 tensor core GEMMs")
 parser.add_argument("--num-images", default=0, type=int,
                     help="number of images to evaluate, 0=all")
+parser.add_argument("--batch", default=1, type=int,
+                    help="number of images evaluated per forward pass")
 parser.add_argument("--benchmark", default=False, action='store_true', 
                     help="benchmark network with single batch")
 
 args = parser.parse_args()
 
+DEBUG = False
+DEBUG_SHAPES = False
+
 class Layer:
     def __init__(self, name=None):
         self.name = name
@@ -63,11 +68,12 @@ class Layer:
         if self.truth is None:
             return
         truth = self.truth[0]
-        output = self.output[0].get()
+        output = self.output.get_nchw()[0]
         if output.shape != truth.shape:
             output = output.reshape(truth.shape)
 
-        print("DT:", output.dtype)
+        if DEBUG:
+            print("DT:", output.dtype)
         if output.dtype == np.float16:
             atol = 0.015
             atol = 0.15
@@ -120,16 +126,20 @@ class SlidingLayer(Layer):
                 self.kW, self.kH, self.dW, self.dH, self.padW, self.padH)
 
 
+# (algo, workspace size) found by benchmarking, shared by all models
+conv_algos = {}
+
 class Convolution(SlidingLayer):
 
     convolution_mode = libcudnn.cudnnConvolutionMode['CUDNN_CROSS_CORRELATION']
     # convolution_mode = libcudnn.cudnnConvolutionMode['CUDNN_CONVOLUTION']
-    convolution_fwd_pref = libcudnn.cudnnConvolutionFwdPreference['CUDNN_CONVOLUTION_FWD_PREFER_FASTEST']
+    identity_algo = libcudnn.cudnnConvolutionFwdAlgo['CUDNN_CONVOLUTION_FWD_ALGO_IMPLICIT_PRECOMP_GEMM']
 
     def __init__(self, config, name="Convolution"):
         super().__init__(config, name)
         self.output = None
 
+        # filters are stored as KCRS (OIHW), GPUTensor uploads them as KRSC
         self.W = self.load_tensor(config, 0)
 
         self.alpha = 1.0
@@ -141,32 +151,19 @@ class Convolution(SlidingLayer):
         self.num_filter_maps = self.W.shape[0]
         self.num_filter_channels = self.W.shape[1]
 
+        # per filter bias, in the (1,K,1,1) shape cudnnAddTensor broadcasts from
         self.bias = self.load_tensor(config, 1, shape=(1, self.num_filter_maps, 1, 1))
-
-        # assert(self.bias.shape[0] == self.num_filter_maps)
-        # self.bias = self.bias.reshape((1, self.num_filter_maps, 1, 1))
-        # print(self.bias.shape)
         self.b_desc = self.bias.get_cudnn_tensor_desc()
 
-        self.filt_desc = libcudnn.cudnnCreateFilterDescriptor()
-        print("FILT:", self.W.dtype, gputensor.np_2_cudnn_dtype[self.W.dtype])
-        print("FILT:", self.W.shape, self.num_filter_maps, self.num_filter_channels, self.kH, self.kW)
-        libcudnn.cudnnSetFilter4dDescriptor(self.filt_desc, 
-                gputensor.np_2_cudnn_dtype[self.W.dtype], self.num_filter_maps,
-                self.num_filter_channels, self.kH, self.kW)
+        self.filt_desc = None
+        self.conv_desc = None
 
-        # print("B:", self.bias.shape)
-        # self.bias_desc = 
-        self.conv_desc = libcudnn.cudnnCreateConvolutionDescriptor()
-        libcudnn.cudnnSetConvolution2dDescriptor(self.conv_desc, self.padH, self.padW,
-                self.dH, self.dW, 1, 1, self.convolution_mode)
-
-    def __del__(self):
-        pass
-        # if self.filt_desc:
-            # libcudnn.cudnnDestroyFilterDescriptor(self.filt_desc)
-        # if self.conv_desc:
-            # libcudnn.cudnnDestroyConvolutionDescriptor(self.conv_desc)
+        # activation folded into the convolution by fuse_activation()
+        self.activation = None
+        self.act_desc = None
+        if DEBUG:
+            print("FILT:", self.W.dtype, gputensor.np_2_cudnn_dtype[self.W.dtype])
+            print("FILT:", self.W.shape, self.num_filter_maps, self.num_filter_channels, self.kH, self.kW)
 
     def configure(self, input):
         # print("Convolution::configure: input shape =", input.shape)
@@ -178,63 +175,128 @@ class Convolution(SlidingLayer):
 
         assert(in_channels == self.num_filter_channels)
        
-        out_width  = int((1.0 * in_width + 2*self.padW - self.kW) / self.dW + 1);
-        out_height = int((1.0 * in_height + 2*self.padH - self.kH) / self.dH + 1);
+        out_width  = (in_width + 2*self.padW - self.kW) // self.dW + 1
+        out_height = (in_height + 2*self.padH - self.kH) // self.dH + 1
 
         self.output = GPUTensor((in_images, self.num_filter_maps, out_height, out_width),
                 input.dtype)
         # print("ONCV:", input.dtype, self.output.dtype)
         # print("Convolution::configure: output shape =", self.output.shape)
    
-        # initialize cudnn descriptors
-        if self.in_desc:
-            libcudnn.cudnnDestroyTensorDescriptor(self.in_desc.ptr)
-        if self.out_desc:
-            libcudnn.cudnnDestroyTensorDescriptor(self.out_desc.ptr)
+        # look up cudnn descriptors, these are shared and owned by the cache
+        self.filt_desc = gputensor.descriptors.get_filter4d(self.num_filter_maps,
+                self.num_filter_channels, self.kH, self.kW,
+                gputensor.np_2_cudnn_dtype[self.W.dtype], GPUTensor.tensor_format)
+        # fp16 data is accumulated in fp32 and may run on tensor cores
+        math_type = libcudnn.cudnnMathType['CUDNN_DEFAULT_MATH']
+        if self.W.dtype == np.float16:
+            math_type = libcudnn.cudnnMathType['CUDNN_TENSOR_OP_MATH']
+        self.conv_desc = gputensor.descriptors.get_conv(self.padH, self.padW,
+                self.dH, self.dW, self.convolution_mode,
+                libcudnn.cudnnDataType['CUDNN_DATA_FLOAT'], math_type)
 
         self.in_desc = input.get_cudnn_tensor_desc()
 
-        # Get output dimensions (first two values are n_input and filters_out)
-        _, _, out_height2, out_width2 = libcudnn.cudnnGetConvolution2dForwardOutputDim(
-            self.conv_desc, self.in_desc.ptr, self.filt_desc)
+        if __debug__ and DEBUG_SHAPES:
+            # cross check the output dimensions against cuDNN
+            _, _, out_height2, out_width2 = libcudnn.cudnnGetConvolution2dForwardOutputDim(
+                self.conv_desc, self.in_desc.ptr, self.filt_desc)
 
-        assert(out_width == out_width2)
-        assert(out_height == out_height2)
+            assert(out_width == out_width2)
+            assert(out_height == out_height2)
 
         self.out_desc = self.output.get_cudnn_tensor_desc()
         
         # find best convolution algorithm
-        self.algo = libcudnn.cudnnGetConvolutionForwardAlgorithm(context.cudnn, self.in_desc.ptr,
-            self.filt_desc, self.conv_desc, self.out_desc.ptr, self.convolution_fwd_pref, 0)
- 
-        print("Convolution::configure: algo=%s" % str(self.algo.value))
-
-        self.ws_size = libcudnn.cudnnGetConvolutionForwardWorkspaceSize(context.cudnn, 
-                self.in_desc.ptr, self.filt_desc, self.conv_desc, self.out_desc.ptr, self.algo)
-        self.ws_ptr  = drv.mem_alloc(self.ws_size.value) if self.ws_size.value > 0 else 0
-
-        print("Convolution::configure: workspace size=%d" % self.ws_size.value)
+        self.algo, self.ws_size = self.find_algorithm(input)
+        context.conv_ws.request(self.ws_size)
+
+        # bias (and activation if fused) are applied by the convolution kernel
+        # itself. The identity activation is only implemented for
+        # IMPLICIT_PRECOMP_GEMM, other winners keep convolution + AddTensor.
+        act_mode = None
+        if self.activation is not None:
+            act_mode = self.activation.mode
+        elif self.algo == self.identity_algo:
+            act_mode = libcudnn.cudnnActivationMode['CUDNN_ACTIVATION_IDENTITY']
+        self.act_desc = None
+        if act_mode is not None:
+            self.act_desc = gputensor.descriptors.get_activation(act_mode,
+                    libcudnn.cudnnNanPropagation['CUDNN_NOT_PROPAGATE_NAN'], 0.0)
+
+        if DEBUG:
+            print("Convolution::configure: algo=%d" % self.algo)
+            print("Convolution::configure: workspace size=%d" % self.ws_size)
+
+        self.out_ptr = self.output.get_gpu_voidp()
+        self.W_ptr = self.W.get_gpu_voidp()
+        self.bias_ptr = self.bias.get_gpu_voidp()
+
+    def find_algorithm(self, input):
+        # benchmark all algorithms within the workspace budget, once per shape
+        key = (input.shape, self.W.shape, self.W.dtype, self.padH, self.padW, self.dH, self.dW)
+        if key not in conv_algos:
+            # not taken from the pool, so the budget goes back to the device
+            # afterwards. When the device is nearly full, search within a smaller
+            # budget, down to algorithms that need no workspace at all.
+            limit = context.conv_ws.limit
+            scratch = None
+            while scratch is None and limit > 0:
+                try:
+                    scratch = drv.mem_alloc(limit)
+                except drv.MemoryError:
+                    context.pool.free_held()
+                    limit = limit // 2 if limit > 1024 * 1024 else 0
+            results = libcudnn.cudnnFindConvolutionForwardAlgorithmEx(context.cudnn,
+                    self.in_desc.ptr, input.get_gpu_voidp(), self.filt_desc, self.W.get_gpu_voidp(),
+                    self.conv_desc, self.out_desc.ptr, self.output.get_gpu_voidp(), 8,
+                    ctypes.c_void_p(None if scratch is None else int(scratch)), limit)
+            if scratch is not None:
+                scratch.free()
+            ok = [ r for r in results if r.status == 0 and r.memory <= limit ]
+            if not ok:
+                raise RuntimeError("no convolution algorithm for input %s, filter %s "
+                        "within a %d byte workspace" % (input.shape, self.W.shape, limit))
+            conv_algos[key] = (ok[0].algo, ok[0].memory)
+        return conv_algos[key]
+
+    def fuse_activation(self, activation):
+        # the fused layer produces what the activation used to, take over its truth
+        self.activation = activation
+        if activation.truth is not None:
+            self.truth = activation.truth
 
     def fprop(self, input):
 
         # print("\nConvolution::fprop: alpha=%f, beta=%f" % (self.alpha, self.beta))
-        
-        ws_data = ctypes.c_void_p(int(self.ws_ptr))
+        if self.act_desc is not None:
+            # z aliases the output with alpha2=0, so only conv+bias feeds the activation
+            libcudnn.cudnnConvolutionBiasActivationForward(context.cudnn, self.alpha,
+                    self.in_desc.ptr, input.get_gpu_voidp(),
+                    self.filt_desc, self.W_ptr,
+                    self.conv_desc, self.algo, context.conv_ws.voidp, self.ws_size,
+                    0.0, self.out_desc.ptr, self.out_ptr,
+                    self.b_desc.ptr, self.bias_ptr, self.act_desc,
+                    self.out_desc.ptr, self.out_ptr)
+            self.check_truth()
+            return
 
-        self.start.record()
         libcudnn.cudnnConvolutionForward(context.cudnn, self.alpha, 
                 self.in_desc.ptr, input.get_gpu_voidp(),
-                self.filt_desc, self.W.get_gpu_voidp(), 
-                self.conv_desc, self.algo, ws_data, self.ws_size.value, self.beta, 
-                self.out_desc.ptr, self.output.get_gpu_voidp())
+                self.filt_desc, self.W_ptr, 
+                self.conv_desc, self.algo, context.conv_ws.voidp, self.ws_size, self.beta, 
+                self.out_desc.ptr, self.out_ptr)
 
-        libcudnn.cudnnAddTensor(context.cudnn, 1.0, self.b_desc.ptr, self.bias.get_gpu_voidp(),
-                1.0, self.out_desc.ptr, self.output.get_gpu_voidp())
+        libcudnn.cudnnAddTensor(context.cudnn, 1.0, self.b_desc.ptr, self.bias_ptr,
+                1.0, self.out_desc.ptr, self.out_ptr)
 
         self.check_truth()
 
     def __str__(self):
-        return "%s, W=%s, b=%s" % (SlidingLayer.__str__(self), self.W.shape, self.bias.shape)
+        s = "%s, W=%s, b=%s" % (SlidingLayer.__str__(self), self.W.shape, self.bias.shape)
+        if self.activation is not None:
+            s += " + " + self.activation.func.name
+        return s
 
 
 class Pooling(SlidingLayer):
@@ -266,38 +328,29 @@ class Pooling(SlidingLayer):
         assert(in_width >= self.kW)
         assert(in_height >= self.kH)
 
-        out_width  = int((math.floor(1.0 * in_width - self.kW + 2*self.padW) / self.dW) + 1)
-        out_height = int((math.floor(1.0 * in_height - self.kH + 2*self.padH) / self.dH) + 1)
+        out_width  = (in_width + 2*self.padW - self.kW) // self.dW + 1
+        out_height = (in_height + 2*self.padH - self.kH) // self.dH + 1
 
         self.output = GPUTensor( (in_images, in_channels, out_height, out_width), input.dtype ) 
 
-        if self.pool_desc:
-            libcudnn.cudnnDestroyPoolingDescriptor(self.pool_desc)
-        if self.in_desc:
-            libcudnn.cudnnDestroyTensorDescriptor(self.in_desc)
-        if self.out_desc:
-            libcudnn.cudnnDestroyTensorDescriptor(self.out_desc)
-
         self.in_desc = input.get_cudnn_tensor_desc()
         self.out_desc = self.output.get_cudnn_tensor_desc()
 
-        self.pool_desc = libcudnn.cudnnCreatePoolingDescriptor()
-        libcudnn.cudnnSetPooling2dDescriptor(self.pool_desc,
+        self.pool_desc = gputensor.descriptors.get_pooling(
             libcudnn.cudnnPoolingMode["CUDNN_POOLING_MAX"],
             # libcudnn.cudnnNanPropagation["CUDNN_NOT_PROPAGATE_NAN"],
             self.kH, self.kW, self.padH, self.padW, self.dH, self.dW)
 
-    def fprop(self, input):
-        in_data = ctypes.c_void_p(int(input.gpudata))
-        out_data = ctypes.c_void_p(int(self.output.gpudata))
+        self.out_ptr = self.output.get_gpu_voidp()
 
+    def fprop(self, input):
         # print("Pooling::fprop()")
         # print("in_data:", input.ptr)
         # print("out_data:", self.output.ptr)
 
         libcudnn.cudnnPoolingForward(context.cudnn, self.pool_desc, self.alpha,
                 self.in_desc.ptr, input.get_gpu_voidp(), 
-                self.beta, self.out_desc.ptr, self.output.get_gpu_voidp())
+                self.beta, self.out_desc.ptr, self.out_ptr)
 
         self.check_truth()
 
@@ -309,6 +362,7 @@ class Activation(Layer):
     def __init__(self, function):
         super().__init__(str(function))
         self.func = function
+        self.mode = libcudnn.cudnnActivationMode['CUDNN_ACTIVATION_RELU']
         self.alpha = 1.0
         self.beta = 0.0
 
@@ -316,14 +370,16 @@ class Activation(Layer):
         self.output = input
 
         self.inout_desc = input.get_cudnn_tensor_desc()
+        self.act_desc = gputensor.descriptors.get_activation(self.mode,
+                libcudnn.cudnnNanPropagation['CUDNN_NOT_PROPAGATE_NAN'], 0.0)
 
     def fprop(self, input):
         # print("Activation::fprop()")
-        data = ctypes.c_void_p(int(input.gpudata))
+        data = input.get_gpu_voidp()
         # print("data ptr =", input.ptr)
     
         libcudnn.cudnnActivationForward(context.cudnn,
-                libcudnn.cudnnActivationMode['CUDNN_ACTIVATION_RELU'],
+                self.act_desc,
                 self.alpha,
                 self.inout_desc.ptr,
                 data,
@@ -336,20 +392,6 @@ class Activation(Layer):
     def __str__(self):
         return "Activation: " + self.func.name 
 
-class Dropout(Layer):
-    def __init__(self, p):
-        super().__init__("Dropout")
-        self.p = 1.0
-
-    def configure(self, input):
-        self.output = input
-
-    def fprop(self, input):
-        input *= self.p
-
-    def __str__(self):
-        return "Dropout: p=%f" % self.p
-
 
 class BatchNormalization(Layer):
     def __init__(self, config):
@@ -382,11 +424,6 @@ class BatchNormalization(Layer):
     def configure(self, input):
         self.output = GPUTensor(input.shape, input.dtype)
 
-        if self.in_desc:
-            libcudnn.cudnnDestroyTensorDescriptor(self.in_desc.ptr)
-        if self.out_desc:
-            libcudnn.cudnnDestroyTensorDescriptor(self.out_desc.ptr)
-
         self.in_desc = input.get_cudnn_tensor_desc()
         self.out_desc = self.output.get_cudnn_tensor_desc()
         # print("BatchNormalization:configure() input=", input.shape, self.W.shape[0])
@@ -419,6 +456,7 @@ class Linear(Layer):
         self.bias = self.load_tensor(config, 1, shape=(1, self.W.shape[0], 1, 1))
         # self.bias = GPUTensor(os.path.join(config["baseDir"], config["parameterFiles"][1]))
         self.b_desc = self.bias.get_cudnn_tensor_desc()
+        self.w_nhwc = False
         # print(self.W.shape)
     
     def configure(self, input):
@@ -426,20 +464,29 @@ class Linear(Layer):
         # print("Linear::configure: W shape =", self.W.shape)
         # print("Linear::configure: b shape =", self.bias.shape)
 
-        elems_per_image  = np.prod(input.shape)
+        elems_per_image  = np.prod(input.shape[1:])
         # print(elems_per_image, self.W.shape[1])
 
         assert(elems_per_image == self.W.shape[1])
-        self.output = GPUTensor((1,self.W.shape[0], 1, 1), dtype=input.dtype)
+
+        # the weights assume a CHW flattened input, reorder the columns once
+        # to match the HWC order of channels-last feature maps
+        n, c, h, w = input.shape
+        if h * w > 1 and not self.w_nhwc:
+            W = self.W.get().reshape((-1, c, h, w)).transpose(0, 2, 3, 1)
+            self.W.set(np.ascontiguousarray(W).reshape(self.W.shape))
+            self.w_nhwc = True
+        self.output = GPUTensor((n, self.W.shape[0], 1, 1), dtype=input.dtype)
         self.output_desc = self.output.get_cudnn_tensor_desc()
         
-        if self.truth is not None:
+        if DEBUG and self.truth is not None:
             print("OUTPUT TRUTH SHAPE:", self.truth.shape, self.output.shape)
 
     def fprop(self, input):
         # print("PAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA")
-        input_2d = input.reshape((self.W.shape[1], 1)) 
-        output_2d = self.output.reshape(self.W.shape[0], 1)
+        # one GEMM for the whole batch: (B x N) . (K x N)^T = (B x K)
+        input_2d = input.reshape((input.shape[0], self.W.shape[1]))
+        output_2d = self.output.reshape((self.output.shape[0], self.W.shape[0]))
         # print(input_2d.flags.c_contiguous)
         # print(output_2d.flags.c_contiguous)
 
@@ -454,7 +501,7 @@ class Linear(Layer):
         # print("B':", input_2d.shape, input_2d.strides, input_2d.size, input_2d.mem_size, str(input_2d.flags.c_contiguous))
         # print("C:", output_2d.shape, output_2d.strides, output_2d.size, output_2d.mem_size, str(output_2d.flags.c_contiguous))
         # print("Linear::fprop()", self.W.shape, input_2d.shape, output_2d.shape)
-        cublas_dot.cublas_gemm(context.cublas, self.W, input_2d, output_2d)
+        cublas_dot.cublas_gemm(context.cublas, input_2d, self.W, output_2d, transb=True)
 
         # print("Linear::fprop()", self.output.shape)
         libcudnn.cudnnAddTensor(context.cudnn, 1.0, self.b_desc.ptr, self.bias.get_gpu_voidp(),
@@ -469,11 +516,22 @@ class Linear(Layer):
 class SoftMax(Layer):
     class Mode(enum.IntEnum):
         FAST = 1,
-        LOG = 2
+        LOG = 2,
+        ACCURATE = 3
+
+    algorithms = {
+        Mode.FAST: "CUDNN_SOFTMAX_FAST",
+        Mode.LOG: "CUDNN_SOFTMAX_LOG",
+        Mode.ACCURATE: "CUDNN_SOFTMAX_ACCURATE",
+    }
 
     def __init__(self, mode):
         super().__init__("SoftMax")
         self.mode = mode
+        self.algo = libcudnn.cudnnSoftmaxAlgorithm[self.algorithms[mode]]
+        self.softmax_mode = libcudnn.cudnnSoftmaxMode['CUDNN_SOFTMAX_MODE_CHANNEL']
+        self.alpha = 1.0
+        self.beta = 0.0
 
     def __str__(self):
         return "SoftMax: %s" % self.mode
@@ -485,18 +543,70 @@ class SoftMax(Layer):
         # self.out_desc = 
         self.output = input
 
-    def fprop(self, input):
-        algo = libcudnn.cudnnSoftmaxAlgorithm["CUDNN_SOFTMAX_LOG"]
-        mode = libcudnn.cudnnSoftmaxMode['CUDNN_SOFTMAX_MODE_CHANNEL']
+        # computed in place, input and output share descriptor and data
+        self.desc_ptr = self.in_desc.ptr
+        self.data_ptr = input.get_gpu_voidp()
 
-        alpha = 1.0
-        beta = 0.0
-        libcudnn.cudnnSoftmaxForward(context.cudnn, algo, mode, alpha, self.in_desc.ptr, input.get_gpu_voidp(),
-                beta, self.in_desc.ptr, self.output.get_gpu_voidp())
+    def fprop(self, input):
+        libcudnn.cudnnSoftmaxForward(context.cudnn, self.algo, self.softmax_mode, self.alpha,
+                self.desc_ptr, self.data_ptr, self.beta, self.desc_ptr, self.data_ptr)
 
         self.check_truth()
 
+argmax_source = """
+#include <cuda_fp16.h>
+
+__device__ float load(const float *x, int i) { return x[i]; }
+__device__ float load(const __half *x, int i) { return __half2float(x[i]); }
+
+// one block per row of a (rows, K) matrix, ties go to the lowest index and
+// a row without any value above -FLT_MAX (all NaN or -inf) gives index 0
+template <typename T>
+__device__ void argmax_rows(const T *x, int *out, int K)
+{
+    __shared__ float best_val[ARGMAX_THREADS];
+    __shared__ int best_idx[ARGMAX_THREADS];
+
+    const T *row = x + (size_t)blockIdx.x * K;
+    float v = -FLT_MAX;
+    int idx = 0;
+    for (int i = threadIdx.x; i < K; i += blockDim.x) {
+        float xi = load(row, i);
+        if (xi > v) {
+            v = xi;
+            idx = i;
+        }
+    }
+    best_val[threadIdx.x] = v;
+    best_idx[threadIdx.x] = idx;
+    __syncthreads();
+
+    for (int s = blockDim.x / 2; s > 0; s >>= 1) {
+        if (threadIdx.x < s) {
+            float ov = best_val[threadIdx.x + s];
+            int oi = best_idx[threadIdx.x + s];
+            if (ov > best_val[threadIdx.x] ||
+                    (ov == best_val[threadIdx.x] && oi < best_idx[threadIdx.x])) {
+                best_val[threadIdx.x] = ov;
+                best_idx[threadIdx.x] = oi;
+            }
+        }
+        __syncthreads();
+    }
+    if (threadIdx.x == 0)
+        out[blockIdx.x] = best_idx[0];
+}
+
+extern "C" {
+__global__ void argmax_rows_f32(const float *x, int *out, int K) { argmax_rows(x, out, K); }
+__global__ void argmax_rows_f16(const __half *x, int *out, int K) { argmax_rows(x, out, K); }
+}
+"""
+
 class Model:
+    argmax_threads = 256
+    argmax_kernels = None
+
     def __init__(self, json_model_file, dtype=np.float32, load_truth=False):
         self.layers = []
         
@@ -504,6 +614,10 @@ class Model:
         self.dtype = dtype
         self.configured_shape = None
 
+        # predicted class indices, computed on the GPU so only these are copied back
+        self.predicted = None
+        self.predicted_host = None
+
         with open(json_model_file) as f:
             jm = json.load(f)
 
@@ -516,6 +630,10 @@ class Model:
         for layer in jm["layers"]:
             if layer["type"] == "View":
                 continue
+            if layer["type"] == "Dropout":
+                # identity at inference, only keep the truth file numbering in step
+                gi += 1
+                continue
             layer["baseDir"] = os.path.dirname(json_model_file)
             layer["dtype"] = dtype
 
@@ -528,8 +646,22 @@ class Model:
                     print("Loaded truth for layer %d from %s" % (gi, gtfn))
                 gi += 1
 
+        self.fuse_layers()
+
         # print(json.dumps(jm["layers"], indent=2))
 
+    def fuse_layers(self):
+        # fold ReLU into the preceding convolution (cudnnConvolutionBiasActivationForward)
+        layers = []
+        for layer in self.layers:
+            if isinstance(layer, Activation) and layer.func == Activation.Func.ReLU and \
+                    layers and isinstance(layers[-1], Convolution) and \
+                    layers[-1].activation is None:
+                layers[-1].fuse_activation(layer)
+            else:
+                layers.append(layer)
+        self.layers = layers
+
     def normalize(self, data):
 
         # print(data.shape, self.average, self.std_dev)
@@ -550,8 +682,6 @@ class Model:
             return Pooling(Pooling.Mode.MAX, layer)
         elif layer_type == "SpatialBatchNormalization":
             return BatchNormalization(layer)
-        elif layer_type == "Dropout":
-            return Dropout(layer["p"])
         elif layer_type == "Linear":
             return Linear(layer)
         elif layer_type == "LogSoftMax":
@@ -565,7 +695,8 @@ class Model:
         return s
 
     def configure(self, input):
-        print("Model::configure() input shape:", input.shape)
+        if DEBUG:
+            print("Model::configure() input shape:", input.shape)
         self.input = input
 
         if not self.layers:
@@ -575,52 +706,123 @@ class Model:
         for i in range(1, len(self.layers)):
             self.layers[i].configure(self.layers[i-1].output)
 
-    def evaluate(self, input):
+        # all convolutions have reported their needs, allocate the shared workspace
+        context.conv_ws.ensure(context.conv_ws.max_seen)
+
+        n = input.shape[0]
+        self.predicted = gpuarray.empty(n, np.int32, allocator=context.allocate)
+        self.predicted_host = drv.pagelocked_empty(n, np.int32)
+
+    def forward(self, input, argmax_only=False):
+        # queues the forward pass on context.stream without waiting for it
         if self.configured_shape is None or self.configured_shape != input.shape:
             self.configure(input)
             self.configured_shape = input.shape
 
+        layers = self.layers
+        if argmax_only and isinstance(layers[-1], SoftMax):
+            # softmax is monotonic and computed in place, so the argmax of its
+            # input, left in the same buffer, is the same prediction
+            layers = layers[:-1]
+
         # print("INPUT:", self.input.get()[0][1][1])
-        self.layers[0].fprop(input)
+        layers[0].fprop(input)
 
-        for i in range(1, len(self.layers)):
-            self.layers[i].fprop(self.layers[i-1].output)
+        for i in range(1, len(layers)):
+            layers[i].fprop(layers[i-1].output)
 
+    def evaluate(self, input):
+        self.forward(input)
+        return self.results()
+
+    def predict(self, input):
+        self.forward(input, argmax_only=True)
+        return self.predictions()
+
+    @classmethod
+    def argmax_kernel(cls, dtype):
+        # compiled on first use so evaluate()/results() work without nvcc
+        if cls.argmax_kernels is None:
+            module = SourceModule("#include <float.h>\n#define ARGMAX_THREADS %d\n" %
+                    cls.argmax_threads + argmax_source, no_extern_c=True)
+            cls.argmax_kernels = {}
+            for kernel_dtype, name in [ (np.float32, "argmax_rows_f32"),
+                                        (np.float16, "argmax_rows_f16") ]:
+                kernel = module.get_function(name)
+                kernel.prepare("PPi")
+                cls.argmax_kernels[np.dtype(kernel_dtype)] = kernel
+        return cls.argmax_kernels[np.dtype(dtype)]
+
+    def predictions(self):
+        # argmax of the queued forward pass, only the class indices leave the GPU
+        output = self.layers[-1].output
+        n = output.shape[0]
+        self.argmax_kernel(output.dtype).prepared_async_call((n, 1), (self.argmax_threads, 1, 1), context.stream,
+                output.gpudata, self.predicted.gpudata, np.int32(output.size // n))
+        drv.memcpy_dtoh_async(self.predicted_host, self.predicted.gpudata, context.stream)
+        context.stream.synchronize()
+        labels = [ self.classes[i] for i in self.predicted_host ]
+
+        if DEBUG:
+            # cross check against the host argmax of the full output
+            assert(labels == self.results())
+
+        return labels
+
+    def results(self):
+        # full output copy, for debugging
+        context.stream.synchronize()
         y = self.layers[-1].output.get()
-        i = np.argmax(y)
-        return self.classes[i]
+        y = y.reshape((y.shape[0], -1))
+        return [ self.classes[i] for i in np.argmax(y, axis=1) ]
+
+def alloc_batch(datasrc, model, batch_size):
+    # pinned so it can be the source of an async copy
+    return drv.pagelocked_zeros((batch_size, datasrc.crop_height, datasrc.crop_width, 3),
+            dtype=model.dtype)
+
+def read_batch(datasrc, model, batch, n):
+    """
+    Decode and normalize n items straight into the (B,H,W,C) host buffer.
+    Returns the labels.
+    """
+    return [ datasrc.get_item_into(batch[i], model.average, model.std_dev)
+             for i in range(n) ]
+
+def batch_tensor(batch):
+    # host data is HWC already, only the logical shape is NCHW
+    n, h, w, c = batch.shape
+    return GPUTensor((n, c, h, w), batch.dtype)
 
 def benchmark(datasrc, model):
     start = time.time()
-    label, data = datasrc.get_item()
+    batch = alloc_batch(datasrc, model, args.batch)
+    labels = read_batch(datasrc, model, batch, args.batch)
     print("Data load time: %.2fms" % ((time.time() - start) * 1000.0))
 
-    start = time.time()
-    data = np.ascontiguousarray(np.expand_dims(np.rollaxis(data,2), 0)).astype(model.dtype)
-    data = model.normalize(data)
-    print("Data prep time: %.2fms" % ((time.time() - start) * 1000.0))
-
-    input_tensor = GPUTensor(data)
+    input_tensor = batch_tensor(batch)
+    input_tensor.set(batch)
     # warmup...
     for i in range(1):
-         model.evaluate(input_tensor)
+         model.predict(input_tensor)
     start = time.time()
     num_iterations = 100
     print("Timing %d iterations..." % num_iterations)
     for i in range(num_iterations):
         if i == num_iterations - 1:
             drv.start_profiler()
-        y = model.evaluate(input_tensor)
-        print(y)
+        y = model.predict(input_tensor)
+        if DEBUG:
+            print(y)
     drv.stop_profiler()
 
     et = (time.time() - start) * 1000 / num_iterations
-    print("Model eval time: %.2fms = %.1ffps" % (et, 1000.0 / et))
+    print("Model eval time: %.2fms = %.1ffps" % (et, 1000.0 * args.batch / et))
 
 def str_to_np_dtype(s):
     if s == 'fp16':
         return np.float16
-    elif s == 'fp32':
+    elif s in ['fp32', 'tf32']:
         return np.float32
     else:
         print("unsupported precision '%s'" % s)
@@ -633,6 +835,7 @@ if __name__ == "__main__":
     # yt, data = datasrc.get_item()
     # print(data.shape)
     # exit(0)
+    cublas_dot.use_tf32 = args.precision == 'tf32'
     model = Model(args.model, str_to_np_dtype(args.precision), load_truth=False)
     print(model)
 
@@ -650,10 +853,23 @@ if __name__ == "__main__":
                # ["n01644900","n01770393"],
                # ["n04019541","n04019541"]]
 
-    for i in range(num):
-        yt, data = datasrc.get_item()
-        data = np.ascontiguousarray(np.expand_dims(np.rollaxis(data,2), 0)).astype(model.dtype)
-        data = model.normalize(data)
+    # double buffered: while the GPU evaluates one batch the next one is
+    # decoded into the other pinned host buffer and copied on copy_stream
+    copy_stream = drv.Stream()
+    labels = [ None, None ]
+    batches = [ None, None ]
+    tensors = [ None, None ]
+    for j in range(2):
+        batches[j] = alloc_batch(datasrc, model, args.batch)
+        tensors[j] = batch_tensor(batches[j])
+
+    labels[0] = read_batch(datasrc, model, batches[0], min(args.batch, num))
+    tensors[0].set(batches[0])
+
+    cur = 0
+    for i in range(0, num, args.batch):
+        # the last batch may be partial, the padding results are ignored
+        n = min(args.batch, num - i)
         # yt = results[i][0]
         # data = np.expand_dims(inputs[i], 0).astype(input_dtype)
         # print(data.shape, data.dtype)
@@ -661,11 +877,22 @@ if __name__ == "__main__":
         # print(np.allclose(data,data2))
         # continue
         # exit(0)
-        input_tensor = GPUTensor(data)
         # print(data.shape)
         # model.configure(input_tensor)
-        y = model.evaluate(input_tensor)
-        print(y, yt)
-        if y != yt:
-            num_errors += 1
+        model.forward(tensors[cur], argmax_only=True)
+
+        nxt = 1 - cur
+        if i + args.batch < num:
+            labels[nxt] = read_batch(datasrc, model, batches[nxt],
+                    min(args.batch, num - i - args.batch))
+            drv.memcpy_htod_async(tensors[nxt].gpudata, batches[nxt], copy_stream)
+
+        ys = model.predictions()
+        copy_stream.synchronize()
+
+        for y, yt in zip(ys[:n], labels[cur]):
+            print(y, yt)
+            if y != yt:
+                num_errors += 1
+        cur = nxt
     print("DONE: %d images classified, error rate=%.4f" % (num, 1.0 * num_errors / num))
@@ -25,14 +25,18 @@ import so_utils
 
 # Load library:
 _version_list = [7.5, 7.0, 6.5, 6.0, 5.5, 5.0, 4.0]
+# from CUDA 10 on the library is versioned by major version only
+_major_version_list = [12, 11, 10]
 if 'linux' in sys.platform:
     _libcublas_libname_list = ['libcublas.so'] + \
+                              ['libcublas.so.%d' % v for v in _major_version_list] + \
                               ['libcublas.so.%s' % v for v in _version_list]
 elif sys.platform == 'darwin':
     _libcublas_libname_list = ['libcublas.dylib']
 elif sys.platform == 'win32':
     if sys.maxsize > 2**32:
         _libcublas_libname_list = ['cublas.dll'] + \
+                                  ['cublas64_%d.dll' % v for v in _major_version_list] + \
                                   ['cublas64_%s.dll' % int(10*v) for v in _version_list]
     else:
         _libcublas_libname_list = ['cublas.dll'] + \
@@ -327,6 +331,38 @@ def cublasSetStream(handle, id):
     status = _libcublas.cublasSetStream_v2(handle, id)
     cublasCheckStatus(status)
 
+_CUBLAS_MATH_MODE = {
+    'CUBLAS_DEFAULT_MATH': 0,
+    'CUBLAS_TENSOR_OP_MATH': 1,
+    'CUBLAS_PEDANTIC_MATH': 2,
+    'CUBLAS_TF32_TENSOR_OP_MATH': 3,
+    }
+
+if _cublas_version >= 9000:
+    _libcublas.cublasSetMathMode.restype = int
+    _libcublas.cublasSetMathMode.argtypes = [_types.handle,
+                                             ctypes.c_int]
+
+@_cublas_version_req(9.0)
+def cublasSetMathMode(handle, mode):
+    """
+    Set whether CUBLAS may use tensor core operations.
+
+    Parameters
+    ----------
+    handle : id
+        CUBLAS context.
+    mode : str
+        Math mode, one of the keys of `_CUBLAS_MATH_MODE`.
+
+    References
+    ----------
+    `cublasSetMathMode <http://docs.nvidia.com/cuda/cublas/#cublassetmathmode>`_
+    """
+
+    status = _libcublas.cublasSetMathMode(handle, _CUBLAS_MATH_MODE[mode])
+    cublasCheckStatus(status)
+
 _libcublas.cublasGetStream_v2.restype = int
 _libcublas.cublasGetStream_v2.argtypes = [_types.handle,
                                           ctypes.c_void_p]
@@ -4323,6 +4359,84 @@ def cublasHgemm(handle, transa, transb, m, n, k, alpha, A, lda, B, ldb, beta, C,
                                        int(C), ldc)
     cublasCheckStatus(status)
 
+# GEMMEX
+_CUDA_DATA_TYPE = {
+    'CUDA_R_32F': 0,
+    'CUDA_R_64F': 1,
+    'CUDA_R_16F': 2,
+    'CUDA_R_8I': 3,
+    'CUDA_R_32I': 10,
+    }
+
+_CUBLAS_GEMM_ALGO = {
+    'CUBLAS_GEMM_DEFAULT': -1,
+    'CUBLAS_GEMM_DEFAULT_TENSOR_OP': 99,
+    }
+
+# cublasComputeType_t, CUBLAS 11 and later also accept these as GemmEx compute type
+_CUBLAS_COMPUTE_TYPE = {
+    'CUBLAS_COMPUTE_16F': 64,
+    'CUBLAS_COMPUTE_32F': 68,
+    'CUBLAS_COMPUTE_32F_FAST_16F': 74,
+    'CUBLAS_COMPUTE_32F_FAST_TF32': 77,
+    }
+
+if _cublas_version >= 8000:
+    _libcublas.cublasGemmEx.restype = int
+    _libcublas.cublasGemmEx.argtypes = [_types.handle,
+                                        ctypes.c_int,
+                                        ctypes.c_int,
+                                        ctypes.c_int,
+                                        ctypes.c_int,
+                                        ctypes.c_int,
+                                        ctypes.c_void_p,
+                                        ctypes.c_void_p,
+                                        ctypes.c_int,
+                                        ctypes.c_int,
+                                        ctypes.c_void_p,
+                                        ctypes.c_int,
+                                        ctypes.c_int,
+                                        ctypes.c_void_p,
+                                        ctypes.c_void_p,
+                                        ctypes.c_int,
+                                        ctypes.c_int,
+                                        ctypes.c_int,
+                                        ctypes.c_int]
+
+@_cublas_version_req(8.0)
+def cublasGemmEx(handle, transa, transb, m, n, k, alpha, A, Atype, lda, B, Btype, ldb,
+                 beta, C, Ctype, ldc, computeType='CUDA_R_32F', algo='CUBLAS_GEMM_DEFAULT'):
+    """
+    Matrix-matrix product with separately specified data and compute types.
+
+    alpha and beta are passed with the precision of computeType, so fp16
+    matrices can be multiplied with fp32 accumulation.
+
+    References
+    ----------
+    `cublasGemmEx <http://docs.nvidia.com/cuda/cublas/#cublas-GemmEx>`_
+    """
+
+    if computeType in ['CUDA_R_16F', 'CUBLAS_COMPUTE_16F']:
+        alphaRef = ctypes.byref(ctypes.c_short(np.array([alpha], dtype=np.float16).view(np.int16)[0]))
+        betaRef = ctypes.byref(ctypes.c_short(np.array([beta], dtype=np.float16).view(np.int16)[0]))
+    else:
+        alphaRef = ctypes.byref(ctypes.c_float(alpha))
+        betaRef = ctypes.byref(ctypes.c_float(beta))
+
+    status = _libcublas.cublasGemmEx(handle,
+                                     _CUBLAS_OP[transa],
+                                     _CUBLAS_OP[transb], m, n, k,
+                                     alphaRef,
+                                     int(A), _CUDA_DATA_TYPE[Atype], lda,
+                                     int(B), _CUDA_DATA_TYPE[Btype], ldb,
+                                     betaRef,
+                                     int(C), _CUDA_DATA_TYPE[Ctype], ldc,
+                                     _CUBLAS_COMPUTE_TYPE.get(computeType,
+                                         _CUDA_DATA_TYPE.get(computeType)),
+                                     _CUBLAS_GEMM_ALGO[algo])
+    cublasCheckStatus(status)
+
 _libcublas.cublasCgemm_v2.restype = int
 _libcublas.cublasCgemm_v2.argtypes = [_types.handle,
                                       ctypes.c_int,
@@ -7,11 +7,11 @@ import ctypes
 import ctypes.util
 
 if sys.platform in ('linux2', 'linux'):
-    _libcudnn_libname_list = ['libcudnn.so', 'libcudnn.so.4', 'libcudnn.so.4.0.4']
+    _libcudnn_libname_list = ['libcudnn.so', 'libcudnn.so.8', 'libcudnn.so.7']
 elif sys.platform == 'darwin':
-    _libcudnn_libname_list = ['libcudnn.dylib', 'libcudnn.4.dylib']
+    _libcudnn_libname_list = ['libcudnn.dylib', 'libcudnn.8.dylib', 'libcudnn.7.dylib']
 elif sys.platform == 'win32':
-    _libcudnn_libname_list = ['cudnn64_4.dll']
+    _libcudnn_libname_list = ['cudnn64_8.dll', 'cudnn64_7.dll']
 else:
     raise RuntimeError('unsupported platform')
 
@@ -108,6 +108,13 @@ cudnnConvolutionMode = {
                             # be done when applying the filter to the images.
 }
 
+# cudnnMathType_t selects whether Tensor Core operations are permitted
+cudnnMathType = {
+    'CUDNN_DEFAULT_MATH': 0,
+    'CUDNN_TENSOR_OP_MATH': 1,
+    'CUDNN_TENSOR_OP_MATH_ALLOW_CONVERSION': 2
+}
+
 # cudnnConvolutionFwdPreference_t is an enumerated type used by
 # cudnnGetConvolutionForwardAlgorithm() to help the choice of the algorithm used for the
 # forward convolution.
@@ -212,7 +219,11 @@ cudnnPoolingMode = {
 cudnnActivationMode = {
     'CUDNN_ACTIVATION_SIGMOID': 0,  # sigmoid function
     'CUDNN_ACTIVATION_RELU': 1,     # rectified linear function
-    'CUDNN_ACTIVATION_TANH': 2      # hyperbolic tangent function
+    'CUDNN_ACTIVATION_TANH': 2,     # hyperbolic tangent function
+    'CUDNN_ACTIVATION_CLIPPED_RELU': 3, # clipped rectified linear function
+    'CUDNN_ACTIVATION_ELU': 4,      # exponential linear function
+    'CUDNN_ACTIVATION_IDENTITY': 5  # no activation, only valid for
+                                    # cudnnConvolutionBiasActivationForward()
 }
 
 # cudnnNanPropagation_t is an enumerated type to specify the propogation of Nan
@@ -260,6 +271,11 @@ def cudnnGetVersion():
     """
     return _libcudnn.cudnnGetVersion()
 
+# the bindings below follow the cuDNN 7 API, symbols removed in cuDNN 8 are
+# only bound when present
+if cudnnGetVersion() < 7000:
+    raise OSError('cuDNN 7 or later required, found version %d' % cudnnGetVersion())
+
 _libcudnn.cudnnCreate.restype = int
 _libcudnn.cudnnCreate.argtypes = [ctypes.c_void_p]
 def cudnnCreate():
@@ -731,8 +747,9 @@ def cudnnCreateFilterDescriptor():
 
 _libcudnn.cudnnSetFilter4dDescriptor.restype = int
 _libcudnn.cudnnSetFilter4dDescriptor.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_int,
-                                               ctypes.c_int, ctypes.c_int, ctypes.c_int]
-def cudnnSetFilter4dDescriptor(wDesc, dataType, k, c, h, w):
+                                               ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_int]
+def cudnnSetFilter4dDescriptor(wDesc, dataType, k, c, h, w,
+                               format=cudnnTensorFormat['CUDNN_TENSOR_NCHW']):
     """"
     Initialize a filter descriptor.
 
@@ -753,14 +770,17 @@ def cudnnSetFilter4dDescriptor(wDesc, dataType, k, c, h, w):
         Height of each filter.
     w : int
         Width of each filter.
+    format : cudnnTensorFormat
+        Memory layout of the filter, NCHW (KCRS) or NHWC (KRSC).
     """
 
-    status = _libcudnn.cudnnSetFilter4dDescriptor(wDesc, dataType, k, c, h, w)
+    status = _libcudnn.cudnnSetFilter4dDescriptor(wDesc, dataType, format, k, c, h, w)
     cudnnCheckStatus(status)
 
 _libcudnn.cudnnGetFilter4dDescriptor.restype = int
 _libcudnn.cudnnGetFilter4dDescriptor.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
-                                               ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
+                                               ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
+                                               ctypes.c_void_p]
 def cudnnGetFilter4dDescriptor(wDesc):
     """"
     Get parameters of filter descriptor.
@@ -784,20 +804,24 @@ def cudnnGetFilter4dDescriptor(wDesc):
         Height of each filter.
     w : int
         Width of each filter.
+    format : cudnnTensorFormat
+        Layout of the filter.
     """
 
     dataType = ctypes.c_int()
+    format = ctypes.c_int()
     k = ctypes.c_int()
     c = ctypes.c_int()
     h = ctypes.c_int()
     w = ctypes.c_int()
 
     status = _libcudnn.cudnnGetFilter4dDescriptor(wDesc, ctypes.byref(dataType),
+                                                ctypes.byref(format),
                                                 ctypes.byref(k), ctypes.byref(c),
                                                 ctypes.byref(h), ctypes.byref(w))
     cudnnCheckStatus(status)
 
-    return dataType.value, k.value, c.value, h.value, w.value
+    return dataType.value, k.value, c.value, h.value, w.value, format.value
 
 _libcudnn.cudnnDestroyFilterDescriptor.restype = int
 _libcudnn.cudnnDestroyFilterDescriptor.argtypes = [ctypes.c_void_p]
@@ -840,8 +864,10 @@ def cudnnCreateConvolutionDescriptor():
 _libcudnn.cudnnSetConvolution2dDescriptor.restype = int
 _libcudnn.cudnnSetConvolution2dDescriptor.argtypes = [ctypes.c_void_p, ctypes.c_int,
                                                     ctypes.c_int, ctypes.c_int, ctypes.c_int,
-                                                    ctypes.c_int, ctypes.c_int]
-def cudnnSetConvolution2dDescriptor(convDesc, pad_h, pad_w, u, v, upscalex, upscaley, mode):
+                                                    ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                                                    ctypes.c_int]
+def cudnnSetConvolution2dDescriptor(convDesc, pad_h, pad_w, u, v, upscalex, upscaley, mode,
+                                    computeType=cudnnDataType['CUDNN_DATA_FLOAT']):
     """"
     Initialize a convolution descriptor.
 
@@ -871,14 +897,37 @@ def cudnnSetConvolution2dDescriptor(convDesc, pad_h, pad_w, u, v, upscalex, upsc
         Upscale the input in y-direction.
     mode : cudnnConvolutionMode
         Select between CUDNN_CONVOLUTION or CUDNN_CROSS_CORRELATION.
+    computeType : cudnnDataType
+        Precision the convolution is computed in (cuDNN 6 and later).
     """
 
     status = _libcudnn.cudnnSetConvolution2dDescriptor(convDesc, pad_h, pad_w, u, v,
-                                                        upscalex, upscaley, mode)
+                                                        upscalex, upscaley, mode, computeType)
+    cudnnCheckStatus(status)
+
+_libcudnn.cudnnSetConvolutionMathType.restype = int
+_libcudnn.cudnnSetConvolutionMathType.argtypes = [ctypes.c_void_p, ctypes.c_int]
+def cudnnSetConvolutionMathType(convDesc, mathType):
+    """"
+    Select whether the convolution may use Tensor Core operations (cuDNN 7).
+
+    Parameters
+    ----------
+    convDesc : cudnnConvolutionDescriptor
+        Handle to a previously created convolution descriptor.
+    mathType : cudnnMathType
+        Enumerant to specify the math type.
+    """
+
+    status = _libcudnn.cudnnSetConvolutionMathType(convDesc, mathType)
     cudnnCheckStatus(status)
 
 _libcudnn.cudnnGetConvolution2dDescriptor.restype = int
-_libcudnn.cudnnGetConvolution2dDescriptor.argtypes = [ctypes.c_void_p]
+_libcudnn.cudnnGetConvolution2dDescriptor.argtypes = [ctypes.c_void_p, ctypes.c_void_p,
+                                                    ctypes.c_void_p, ctypes.c_void_p,
+                                                    ctypes.c_void_p, ctypes.c_void_p,
+                                                    ctypes.c_void_p, ctypes.c_void_p,
+                                                    ctypes.c_void_p]
 def cudnnGetConvolution2dDescriptor(convDesc):
     """"
     Get a convolution descriptor.
@@ -908,6 +957,8 @@ def cudnnGetConvolution2dDescriptor(convDesc):
         Upscale the input in y-direction.
     mode : cudnnConvolutionMode
         Either CUDNN_CONVOLUTION or CUDNN_CROSS_CORRELATION.
+    computeType : cudnnDataType
+        Compute precision.
     """
     pad_h = ctypes.c_int()
     pad_w = ctypes.c_int()
@@ -916,16 +967,19 @@ def cudnnGetConvolution2dDescriptor(convDesc):
     upscalex = ctypes.c_int()
     upscaley = ctypes.c_int()
     mode = ctypes.c_int()
+    computeType = ctypes.c_int()
 
     status = _libcudnn.cudnnGetConvolution2dDescriptor(convDesc, ctypes.byref(pad_h),
                                                     ctypes.byref(pad_w), ctypes.byref(u),
                                                     ctypes.byref(v), ctypes.byref(upscalex),
                                                     ctypes.byref(upscaley),
-                                                    ctypes.byref(mode))
+                                                    ctypes.byref(mode),
+                                                    ctypes.byref(computeType))
 
     cudnnCheckStatus(status)
 
-    return pad_h.value, pad_w.value, u.value, v.value, upscalex.value, upscaley.value, mode.value
+    return pad_h.value, pad_w.value, u.value, v.value, upscalex.value, upscaley.value, mode.value, \
+        computeType.value
 
 _libcudnn.cudnnGetConvolution2dForwardOutputDim.restype = int
 _libcudnn.cudnnGetConvolution2dForwardOutputDim.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
@@ -1011,10 +1065,14 @@ def cudnnDestroyConvolutionDescriptor(convDesc):
     cudnnCheckStatus(status)
 
 class cudnnConvolutionFwdAlgoPerf(ctypes.Structure):
+    # cuDNN 7 layout, determinism/mathType/reserved pad the struct to its C size
     _fields_ = [("algo", ctypes.c_int),
                 ("status", ctypes.c_int),
                 ("time", ctypes.c_float),
-                ("memory", ctypes.c_size_t)]
+                ("memory", ctypes.c_size_t),
+                ("determinism", ctypes.c_int),
+                ("mathType", ctypes.c_int),
+                ("reserved", ctypes.c_int * 3)]
 
     def __str__(self):
         return '(algo=%d, status=%d, time=%f, memory=%d)' % (self.algo,
@@ -1049,11 +1107,56 @@ def cudnnFindConvolutionForwardAlgorithm(handle, xDesc, wDesc, convDesc, yDesc,
     return perfResults[0:returnedAlgoCount.value]
 
 
-_libcudnn.cudnnGetConvolutionForwardAlgorithm.restype = int
-_libcudnn.cudnnGetConvolutionForwardAlgorithm.argtypes = [ctypes.c_void_p,
-                                                          ctypes.c_void_p, ctypes.c_void_p,
-                                                          ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int,
-                                                          ctypes.c_size_t, ctypes.c_void_p]
+_libcudnn.cudnnFindConvolutionForwardAlgorithmEx.restype = int
+_libcudnn.cudnnFindConvolutionForwardAlgorithmEx.argtypes = [ctypes.c_void_p, # handle
+                                                             ctypes.c_void_p, # xDesc
+                                                             ctypes.c_void_p, # x
+                                                             ctypes.c_void_p, # wDesc
+                                                             ctypes.c_void_p, # w
+                                                             ctypes.c_void_p, # convDesc
+                                                             ctypes.c_void_p, # yDesc
+                                                             ctypes.c_void_p, # y
+                                                             ctypes.c_int, # requestAlgoCount
+                                                             ctypes.c_void_p, # returnedAlgoCount
+                                                             ctypes.c_void_p, # perfResults
+                                                             ctypes.c_void_p, # workSpace
+                                                             ctypes.c_size_t] # workSpaceSizeInBytes
+def cudnnFindConvolutionForwardAlgorithmEx(handle, xDesc, x, wDesc, w, convDesc, yDesc, y,
+                                           requestedAlgoCount, workSpace, workSpaceSizeInBytes):
+    """"
+    Benchmark the forward convolution algorithms on user provided buffers.
+
+    Every algorithm is run on x, w and y (y is overwritten) and those needing
+    more than workSpaceSizeInBytes of workspace are skipped. Results are
+    sorted by execution time, fastest first.
+
+    Returns
+    -------
+    perfResults : list of cudnnConvolutionFwdAlgoPerf
+    """
+    perfResultsType = cudnnConvolutionFwdAlgoPerf * requestedAlgoCount
+    perfResults = perfResultsType()
+    returnedAlgoCount = ctypes.c_int()
+    status = _libcudnn.cudnnFindConvolutionForwardAlgorithmEx(handle,
+                                                              xDesc, x,
+                                                              wDesc, w,
+                                                              convDesc,
+                                                              yDesc, y,
+                                                              ctypes.c_int(requestedAlgoCount),
+                                                              ctypes.byref(returnedAlgoCount),
+                                                              ctypes.cast(perfResults, ctypes.POINTER(cudnnConvolutionFwdAlgoPerf)),
+                                                              workSpace,
+                                                              ctypes.c_size_t(workSpaceSizeInBytes))
+    cudnnCheckStatus(status)
+    return perfResults[0:returnedAlgoCount.value]
+
+# removed in cuDNN 8, use cudnnFindConvolution*Algorithm instead
+if hasattr(_libcudnn, 'cudnnGetConvolutionForwardAlgorithm'):
+    _libcudnn.cudnnGetConvolutionForwardAlgorithm.restype = int
+    _libcudnn.cudnnGetConvolutionForwardAlgorithm.argtypes = [ctypes.c_void_p,
+                                                              ctypes.c_void_p, ctypes.c_void_p,
+                                                              ctypes.c_void_p, ctypes.c_void_p, ctypes.c_int,
+                                                              ctypes.c_size_t, ctypes.c_void_p]
 def cudnnGetConvolutionForwardAlgorithm(handle, srcDesc, wDesc,
                                         convDesc, destDesc, preference, memoryLimitInbytes):
     """"
@@ -1204,6 +1307,69 @@ def cudnnConvolutionForward(handle, alpha, srcDesc, srcData, wDesc, w,
                                             betaRef, destDesc, destData)
     cudnnCheckStatus(status)
 
+_libcudnn.cudnnConvolutionBiasActivationForward.restype = int
+_libcudnn.cudnnConvolutionBiasActivationForward.argtypes = [ctypes.c_void_p, ctypes.c_void_p,
+                                              ctypes.c_void_p, ctypes.c_void_p,
+                                              ctypes.c_void_p, ctypes.c_void_p,
+                                              ctypes.c_void_p, ctypes.c_int,
+                                              ctypes.c_void_p, ctypes.c_size_t,
+                                              ctypes.c_void_p,
+                                              ctypes.c_void_p, ctypes.c_void_p,
+                                              ctypes.c_void_p, ctypes.c_void_p,
+                                              ctypes.c_void_p,
+                                              ctypes.c_void_p, ctypes.c_void_p]
+def cudnnConvolutionBiasActivationForward(handle, alpha1, srcDesc, srcData, wDesc, w,
+                                          convDesc, algo, workspace, workSpaceSizeInBytes,
+                                          alpha2, zDesc, z, biasDesc, bias, activationDesc,
+                                          destDesc, destData):
+    """"
+    Fused convolution, bias and activation. Requires cuDNN 6 or later.
+
+    Computes "dest = act(alpha1 * conv(src, w) + alpha2 * z + bias)" in a single
+    call.
+
+    Parameters
+    ----------
+    handle : cudnnHandle
+        Handle to a previously created cuDNN context.
+    alpha1, alpha2: float
+        Scaling factors for the convolution result and z respectively.
+    srcDesc, srcData : cudnnTensorDescriptor, void_p
+        Input tensor descriptor and data.
+    wDesc, w : cudnnFilterDescriptor, void_p
+        Filter descriptor and data.
+    convDesc : cudnnConvolutionDescriptor
+        Previously initialized convolution descriptor.
+    algo: cudnnConvolutionFwdAlgo
+        Convolution algorithm to use.
+    workspace, workSpaceSizeInBytes: void_p, long
+        Workspace for the algorithm and its size.
+    zDesc, z : cudnnTensorDescriptor, void_p
+        Tensor added to the convolution result, may alias dest.
+    biasDesc, bias : cudnnTensorDescriptor, void_p
+        Bias tensor of dimension 1xKx1x1.
+    activationDesc : cudnnActivationDescriptor
+        Activation applied to the sum.
+    destDesc, destData : cudnnTensorDescriptor, void_p
+        Output tensor descriptor and data.
+    """
+
+    dataType = cudnnGetTensor4dDescriptor(destDesc)[0]
+    if dataType == cudnnDataType['CUDNN_DATA_DOUBLE']:
+        alpha1Ref = ctypes.byref(ctypes.c_double(alpha1))
+        alpha2Ref = ctypes.byref(ctypes.c_double(alpha2))
+    else:
+        alpha1Ref = ctypes.byref(ctypes.c_float(alpha1))
+        alpha2Ref = ctypes.byref(ctypes.c_float(alpha2))
+
+    status = _libcudnn.cudnnConvolutionBiasActivationForward(handle, alpha1Ref,
+                                            srcDesc, srcData, wDesc, w,
+                                            convDesc, algo, workspace,
+                                            ctypes.c_size_t(workSpaceSizeInBytes),
+                                            alpha2Ref, zDesc, z, biasDesc, bias,
+                                            activationDesc, destDesc, destData)
+    cudnnCheckStatus(status)
+
 _libcudnn.cudnnConvolutionBackwardBias.restype = int
 _libcudnn.cudnnConvolutionBackwardBias.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
                                                    ctypes.c_void_p, ctypes.c_void_p,
@@ -1293,15 +1459,17 @@ def cudnnFindConvolutionBackwardDataAlgorithm(handle, wDesc, dyDesc,
     cudnnCheckStatus(status)
     return perfResults[0:returnedAlgoCount.value]
 
-_libcudnn.cudnnGetConvolutionBackwardDataAlgorithm.restype = int
-_libcudnn.cudnnGetConvolutionBackwardDataAlgorithm.argtypes = [ctypes.c_void_p,
-                                                               ctypes.c_void_p,
-                                                               ctypes.c_void_p,
-                                                               ctypes.c_void_p,
-                                                               ctypes.c_void_p,
-                                                               ctypes.c_int,
-                                                               ctypes.c_size_t,
-                                                               ctypes.c_void_p]
+# removed in cuDNN 8, use cudnnFindConvolution*Algorithm instead
+if hasattr(_libcudnn, 'cudnnGetConvolutionBackwardDataAlgorithm'):
+    _libcudnn.cudnnGetConvolutionBackwardDataAlgorithm.restype = int
+    _libcudnn.cudnnGetConvolutionBackwardDataAlgorithm.argtypes = [ctypes.c_void_p,
+                                                                   ctypes.c_void_p,
+                                                                   ctypes.c_void_p,
+                                                                   ctypes.c_void_p,
+                                                                   ctypes.c_void_p,
+                                                                   ctypes.c_int,
+                                                                   ctypes.c_size_t,
+                                                                   ctypes.c_void_p]
 def cudnnGetConvolutionBackwardDataAlgorithm(handle, wDesc, dyDesc, convDesc,
                                              dxDesc, preference, memoryLimitInbytes):
     algo = ctypes.c_int()
@@ -1415,15 +1583,17 @@ def cudnnFindConvolutionBackwardFilterAlgorithm(handle, xDesc, dyDesc,
     cudnnCheckStatus(status)
     return perfResults[0:returnedAlgoCount.value]
 
-_libcudnn.cudnnGetConvolutionBackwardFilterAlgorithm.restype = int
-_libcudnn.cudnnGetConvolutionBackwardFilterAlgorithm.argtypes = [ctypes.c_void_p,
-                                                                 ctypes.c_void_p,
-                                                                 ctypes.c_void_p,
-                                                                 ctypes.c_void_p,
-                                                                 ctypes.c_void_p,
-                                                                 ctypes.c_int,
-                                                                 ctypes.c_size_t,
-                                                                 ctypes.c_void_p]
+# removed in cuDNN 8, use cudnnFindConvolution*Algorithm instead
+if hasattr(_libcudnn, 'cudnnGetConvolutionBackwardFilterAlgorithm'):
+    _libcudnn.cudnnGetConvolutionBackwardFilterAlgorithm.restype = int
+    _libcudnn.cudnnGetConvolutionBackwardFilterAlgorithm.argtypes = [ctypes.c_void_p,
+                                                                     ctypes.c_void_p,
+                                                                     ctypes.c_void_p,
+                                                                     ctypes.c_void_p,
+                                                                     ctypes.c_void_p,
+                                                                     ctypes.c_int,
+                                                                     ctypes.c_size_t,
+                                                                     ctypes.c_void_p]
 def cudnnGetConvolutionBackwardFilterAlgorithm(handle, xDesc, dyDesc, convDesc,
                                                dwDesc, preference, memoryLimitInbytes):
     algo = ctypes.c_int()
@@ -1623,11 +1793,13 @@ def cudnnCreatePoolingDescriptor():
 
 _libcudnn.cudnnSetPooling2dDescriptor.restype = int
 _libcudnn.cudnnSetPooling2dDescriptor.argtypes = [ctypes.c_void_p, ctypes.c_int,
+                                                ctypes.c_int,
                                                 ctypes.c_int, ctypes.c_int,
                                                 ctypes.c_int, ctypes.c_int,
                                                 ctypes.c_int, ctypes.c_int]
 def cudnnSetPooling2dDescriptor(poolingDesc, mode, windowHeight, windowWidth,
-                                verticalPadding, horizontalPadding, verticalStride, horizontalStride):
+                                verticalPadding, horizontalPadding, verticalStride, horizontalStride,
+                                maxpoolingNanOpt=cudnnNanPropagation['CUDNN_NOT_PROPAGATE_NAN']):
     """"
     Initialize a 2D pooling descriptor.
 
@@ -1651,17 +1823,19 @@ def cudnnSetPooling2dDescriptor(poolingDesc, mode, windowHeight, windowWidth,
         Pooling vertical stride.
     horizontalStride : int
         Pooling horizontal stride.
+    maxpoolingNanOpt : cudnnNanPropagation
+        Enumerant to specify the Nan propagation mode.
     """
 
-    status = _libcudnn.cudnnSetPooling2dDescriptor(poolingDesc, mode, windowHeight,
-                                                 windowWidth, verticalPadding, horizontalPadding,
+    status = _libcudnn.cudnnSetPooling2dDescriptor(poolingDesc, mode, maxpoolingNanOpt,
+                                                 windowHeight, windowWidth, verticalPadding, horizontalPadding,
                                                  verticalStride, horizontalStride)
     cudnnCheckStatus(status)
 
 _libcudnn.cudnnGetPooling2dDescriptor.restype = int
 _libcudnn.cudnnGetPooling2dDescriptor.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
                                                 ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
-                                                ctypes.c_void_p, ctypes.c_void_p]
+                                                ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p]
 def cudnnGetPooling2dDescriptor(poolingDesc):
     """"
     This function queries a previously created pooling descriptor object.
@@ -1690,6 +1864,7 @@ def cudnnGetPooling2dDescriptor(poolingDesc):
     """
 
     mode = ctypes.c_int()
+    maxpoolingNanOpt = ctypes.c_int()
     windowHeight = ctypes.c_int()
     windowWidth = ctypes.c_int()
     verticalPadding = ctypes.c_int()
@@ -1697,7 +1872,8 @@ def cudnnGetPooling2dDescriptor(poolingDesc):
     verticalStride = ctypes.c_int()
     horizontalStride = ctypes.c_int()
 
-    status = _libcudnn.cudnnGetPooling2dDescriptor(poolingDesc, ctypes.byref(mode), ctypes.byref(windowHeight),
+    status = _libcudnn.cudnnGetPooling2dDescriptor(poolingDesc, ctypes.byref(mode),
+                                              ctypes.byref(maxpoolingNanOpt), ctypes.byref(windowHeight),
                                               ctypes.byref(windowWidth), ctypes.byref(verticalPadding),
                                               ctypes.byref(horizontalPadding), ctypes.byref(verticalStride),
                                               ctypes.byref(horizontalStride))
@@ -1829,11 +2005,65 @@ def cudnnPoolingBackward(handle, poolingDesc, alpha, srcDesc, srcData, srcDiffDe
                                             destDiffDesc, destDiffData)
     cudnnCheckStatus(status)
 
+_libcudnn.cudnnCreateActivationDescriptor.restype = int
+_libcudnn.cudnnCreateActivationDescriptor.argtypes = [ctypes.c_void_p]
+def cudnnCreateActivationDescriptor():
+    """"
+    Create an activation descriptor.
+
+    Returns
+    -------
+    activationDesc : cudnnActivationDescriptor
+        Newly allocated activation descriptor.
+    """
+
+    activationDesc = ctypes.c_void_p()
+    status = _libcudnn.cudnnCreateActivationDescriptor(ctypes.byref(activationDesc))
+    cudnnCheckStatus(status)
+
+    return activationDesc.value
+
+_libcudnn.cudnnSetActivationDescriptor.restype = int
+_libcudnn.cudnnSetActivationDescriptor.argtypes = [ctypes.c_void_p, ctypes.c_int,
+                                                   ctypes.c_int, ctypes.c_double]
+def cudnnSetActivationDescriptor(activationDesc, mode, reluNanOpt, coef):
+    """"
+    Initialize an activation descriptor.
+
+    Parameters
+    ----------
+    activationDesc : cudnnActivationDescriptor
+        Handle to a previously created activation descriptor.
+    mode : cudnnActivationMode
+        Enumerant to specify the activation mode.
+    reluNanOpt : cudnnNanPropagation
+        Enumerant to specify the Nan propagation mode.
+    coef : float
+        Clipping threshold for clipped ReLU or alpha for ELU.
+    """
+
+    status = _libcudnn.cudnnSetActivationDescriptor(activationDesc, mode, reluNanOpt, coef)
+    cudnnCheckStatus(status)
+
+_libcudnn.cudnnDestroyActivationDescriptor.restype = int
+_libcudnn.cudnnDestroyActivationDescriptor.argtypes = [ctypes.c_void_p]
+def cudnnDestroyActivationDescriptor(activationDesc):
+    """"
+    Destroy a previously created activation descriptor.
+
+    Parameters
+    ----------
+    activationDesc : cudnnActivationDescriptor
+    """
+
+    status = _libcudnn.cudnnDestroyActivationDescriptor(activationDesc)
+    cudnnCheckStatus(status)
+
 _libcudnn.cudnnActivationForward.restype = int
-_libcudnn.cudnnActivationForward.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p,
+_libcudnn.cudnnActivationForward.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
                                              ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
                                              ctypes.c_void_p, ctypes.c_void_p]
-def cudnnActivationForward(handle, mode, alpha, srcDesc, srcData, beta, destDesc, destData):
+def cudnnActivationForward(handle, activationDesc, alpha, srcDesc, srcData, beta, destDesc, destData):
     """"
     Apply activation function.
 
@@ -1849,8 +2079,8 @@ def cudnnActivationForward(handle, mode, alpha, srcDesc, srcData, beta, destDesc
     ----------
     handle : cudnnHandle
         Handle to a previously created cuDNN context.
-    mode : cudnnActivationMode
-        Enumerant to specify the activation mode.
+    activationDesc : cudnnActivationDescriptor
+        Activation function to apply.
     alpha: float
         Scaling factor with which every element of the input tensor is multiplied.
     srcDesc : cudnnTensor4dDescription
@@ -1877,16 +2107,16 @@ def cudnnActivationForward(handle, mode, alpha, srcDesc, srcData, beta, destDesc
         alphaRef = ctypes.byref(ctypes.c_float(alpha))
         betaRef = ctypes.byref(ctypes.c_float(beta))
 
-    status = _libcudnn.cudnnActivationForward(handle, mode, alphaRef, srcDesc, srcData,
+    status = _libcudnn.cudnnActivationForward(handle, activationDesc, alphaRef, srcDesc, srcData,
                                               betaRef, destDesc, destData)
     cudnnCheckStatus(status)
 
 _libcudnn.cudnnActivationBackward.restype = int
-_libcudnn.cudnnActivationBackward.argtypes = [ctypes.c_void_p, ctypes.c_int, ctypes.c_void_p, ctypes.c_void_p,
+_libcudnn.cudnnActivationBackward.argtypes = [ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
                                               ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
                                               ctypes.c_void_p, ctypes.c_void_p, ctypes.c_void_p,
                                               ctypes.c_void_p, ctypes.c_void_p]
-def cudnnActivationBackward(handle, mode, alpha, srcDesc, srcData, srcDiffDesc, srcDiffData,
+def cudnnActivationBackward(handle, activationDesc, alpha, srcDesc, srcData, srcDiffDesc, srcDiffData,
                             destDesc, destData, beta, destDiffDesc, destDiffData):
     """"
     Gradient of activation function.
@@ -1903,8 +2133,8 @@ def cudnnActivationBackward(handle, mode, alpha, srcDesc, srcData, srcDiffDesc,
     ----------
     handle : cudnnHandle
         Handle to a previously created cuDNN context.
-    mode : cudnnActivationMode
-        Enumerant to specify the activation mode.
+    activationDesc : cudnnActivationDescriptor
+        Activation function to differentiate.
     alpha: float
         Scaling factor with which every element of the input tensor is multiplied.
     srcDesc : cudnnTensorDescriptor
@@ -1941,7 +2171,7 @@ def cudnnActivationBackward(handle, mode, alpha, srcDesc, srcData, srcDiffDesc,
         alphaRef = ctypes.byref(ctypes.c_float(alpha))
         betaRef = ctypes.byref(ctypes.c_float(beta))
 
-    status = _libcudnn.cudnnActivationBackward(handle, mode, alphaRef, srcDesc, srcData,
+    status = _libcudnn.cudnnActivationBackward(handle, activationDesc, alphaRef, srcDesc, srcData,
                                                srcDiffDesc, srcDiffData,
                                                destDesc, destData, betaRef,
                                                destDiffDesc, destDiffData)
@@ -5,8 +5,10 @@ import struct
 import numpy as np
 from PIL import Image
 from io import BytesIO
+from image_source import ImageSource
+
+class LMDB_Data(ImageSource):
 
-class LMDB_Data:
     def __init__(self, db_path):
 
         self.env = lmdb.open(db_path)
@@ -34,16 +36,20 @@ class LMDB_Data:
         label = (val[4:4+label_len]).decode()
         return label, val[4+label_len:]
 
+    def read_image(self):
+        label, data = self.get_raw_item()
+
+        img = Image.open(BytesIO(data))
+        img = self.crop_center(img, self.crop_width, self.crop_height)
+        return label, img
+
     def get_item(self):
         # key,val = self.cursor.item()
         # self.cursor.next()
         # label_len = struct.unpack("!I", val[0:4])[0]
         # label = (val[4:4+label_len]).decode()
         # print(key, label, len(val))
-        label, data = self.get_raw_item()
-
-        img = Image.open(BytesIO(val[4+label_len:]))
-        img = self.crop_center(img, 224, 224)
+        label, img = self.read_image()
         # img.save("test.ppm")
         # print(img.size)
 
@@ -6,8 +6,10 @@ import os.path
 import tarfile
 from PIL import Image
 from io import BytesIO
+from image_source import ImageSource
+
+class TarData(ImageSource):
 
-class TarData:
     def __init__(self, path):
 
         self.tf = tarfile.TarFile(path, "r") 
@@ -30,14 +32,18 @@ class TarData:
         return cropped
 
 
-    def get_item(self):
+    def read_image(self):
         ti = self.tf.next()
 
         label = os.path.dirname(ti.name)
         bufio = self.tf.extractfile(ti)
         img = Image.open(bufio)
         # print(img.size)
-        img = self.crop_center(img, 224, 224)
+        img = self.crop_center(img, self.crop_width, self.crop_height)
+        return label, img
+
+    def get_item(self):
+        label, img = self.read_image()
         img.save("test.ppm")
         # print(img.size)
 